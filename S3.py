@@ -1,5 +1,6 @@
 
 import boto3
+from botocore.config import Config
 
 import json   # stl class for un/marshalling
 from typing import Union, Dict, List
@@ -27,7 +28,9 @@ class S3:
             service_name="s3",
             region_name="us-west-2",
             aws_access_key_id=credentials.aws_access_key_id,
-            aws_secret_access_key=credentials.aws_secret_access_key
+            aws_secret_access_key=credentials.aws_secret_access_key,
+            # Allow enough connections for concurrent uploads in save_model_output
+            config=Config(max_pool_connections=32)
         )
         self.__bucketName = "lake-tahoe-conditions"
         self.__cwd = Path.cwd()
@@ -5,11 +5,13 @@ Note: all timestamps are in UTC
 """
 
 from bisect import bisect_left
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from numba import njit, prange
 import numpy as np
 import pandas as pd
 import datetime
-import requests
+import orjson
+from dataretrieval.session import SESSION, REQUEST_TIMEOUT
 
 ENDPOINTS = {
     'USCG': "https://tepfsail50.execute-api.us-west-2.amazonaws.com/v1/report/met-uscg2020",
@@ -46,9 +48,9 @@ def get_endpoint_json(url, id, start_date, end_date=None):
         params['rptend'] = format_date(end_date)
 
     # Send request and return data in JSON format
-    response = requests.get(url, params=params)
+    response = SESSION.get(url, params=params, timeout=REQUEST_TIMEOUT)
 
-    response_json = response.json()
+    response_json = orjson.loads(response.content)
     if response_json is None or len(response_json) == 0:
         raise Exception(f"AWS endpoint failed: {response.url}")
 
@@ -158,85 +160,62 @@ Returns:
     2022-02-09 01:20:00+00:00      4.562      7.70              82042.11             0.3268    -117.6  1.975616  4.593141 
 """
 def get_model_historical_data(start_date, end_date=None):
-    parse_date = lambda date: datetime.datetime.strptime(date, "%Y-%m-%d %H:%M:%S") \
-                                               .replace(tzinfo=datetime.timezone.utc)
-
-    buoy_json = get_endpoint_json(ENDPOINTS['NASA_BUOY'], NASA_BUOY_ID, start_date, end_date=end_date)
-    uscg_json = get_endpoint_json(ENDPOINTS['USCG'], USCG_ID, start_date, end_date=end_date)
+    # Request both stations at the same time
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        buoy_future = executor.submit(get_endpoint_json, ENDPOINTS['NASA_BUOY'], NASA_BUOY_ID, start_date, end_date=end_date)
+        uscg_future = executor.submit(get_endpoint_json, ENDPOINTS['USCG'], USCG_ID, start_date, end_date=end_date)
+        buoy_json = buoy_future.result()
+        uscg_json = uscg_future.result()
 
     features = ["shortwave", "air temp", "atmospheric pressure", "relative humidity", "longwave", "wind speed", "wind direction"]
 
-    # Historical data to build and return
-    historical = defaultdict(lambda: [np.nan] * len(features))
-
     ## Parse data samples
     # NASA Buoy data samples
-    for data_sample in buoy_json:
-        # Parse raw data from JSON
-        time = parse_date(data_sample['TmStamp'])
-        air_temp1 = float(data_sample['AirTemp_1'])
-        air_temp2 = float(data_sample['AirTemp_2'])
-        wind_dir1 = float(data_sample['WindDir_1'])
-        wind_dir2 = float(data_sample['WindDir_2'])
-        wind_speed1 = float(data_sample['WindSpeed_1'])
-        wind_speed2 = float(data_sample['WindSpeed_2'])
-
-        # Take average of raw data that was measured with two instruments
-        wind_dir = (wind_dir1 + wind_dir2) / 2
-        wind_speed = (wind_speed1 + wind_speed2) / 2
-        air_temp = (air_temp1 + air_temp2) / 2
-        # Save data for this sample
-        historical[time][features.index("air temp")] = air_temp
-        historical[time][features.index("wind speed")] = wind_speed
-        historical[time][features.index("wind direction")] = wind_dir
+    buoy = pd.DataFrame(buoy_json)
+    buoy['time'] = pd.to_datetime(buoy['TmStamp'], format="%Y-%m-%d %H:%M:%S", utc=True)
+    buoy_fields = ['AirTemp_1', 'AirTemp_2', 'WindDir_1', 'WindDir_2', 'WindSpeed_1', 'WindSpeed_2']
+    buoy[buoy_fields] = buoy[buoy_fields].astype(float)
+
+    # Take average of raw data that was measured with two instruments
+    buoy['air temp'] = (buoy['AirTemp_1'] + buoy['AirTemp_2']) / 2
+    buoy['wind speed'] = (buoy['WindSpeed_1'] + buoy['WindSpeed_2']) / 2
+    buoy['wind direction'] = (buoy['WindDir_1'] + buoy['WindDir_2']) / 2
 
     # USCG data samples
-    for data_sample in uscg_json:
-        # Parse raw data
-        time = parse_date(data_sample['TmStamp'])
-        shortwave_in = float(data_sample['ShortWaveIn_wm2']) 
-        shortwave_out = float(data_sample['ShortWaveOut_wm2']) 
-        bp_mbar = float(data_sample['BP_mbar'])
-        rh_percent = float(data_sample['RH_percent'])
-        longwave_in_corr = float(data_sample['LongWaveInCorr_wm2'])
-
-        # Calculations
-        shortwave = shortwave_in - shortwave_out
-        atmospheric_pressure = bp_mbar * 100 # Convert mbar to Pa
-        relative_humidity = rh_percent / 100 # Convert to fraction
-        longwave = longwave_in_corr
-
-        # Save data for this sample
-        historical[time][features.index("shortwave")] = shortwave
-        historical[time][features.index("atmospheric pressure")] = atmospheric_pressure
-        historical[time][features.index("relative humidity")] = relative_humidity
-        historical[time][features.index("longwave")] = longwave
-
-    # Convert historical data to dataframe
-    df = pd.DataFrame(
-        [[time] + features for time, features in historical.items()],
-        columns=['time'] + features
-    )
+    uscg = pd.DataFrame(uscg_json)
+    uscg['time'] = pd.to_datetime(uscg['TmStamp'], format="%Y-%m-%d %H:%M:%S", utc=True)
+    uscg_fields = ['ShortWaveIn_wm2', 'ShortWaveOut_wm2', 'BP_mbar', 'RH_percent', 'LongWaveInCorr_wm2']
+    uscg[uscg_fields] = uscg[uscg_fields].astype(float)
+
+    # Calculations
+    uscg['shortwave'] = uscg['ShortWaveIn_wm2'] - uscg['ShortWaveOut_wm2']
+    uscg['atmospheric pressure'] = uscg['BP_mbar'] * 100 # Convert mbar to Pa
+    uscg['relative humidity'] = uscg['RH_percent'] / 100 # Convert to fraction
+    uscg['longwave'] = uscg['LongWaveInCorr_wm2']
+
+    # Combine samples from both stations by their timestamp
+    # If a station reports a timestamp twice, keep its latest sample
+    buoy = buoy[['time', 'air temp', 'wind speed', 'wind direction']].drop_duplicates('time', keep='last')
+    uscg = uscg[['time', 'shortwave', 'atmospheric pressure', 'relative humidity', 'longwave']].drop_duplicates('time', keep='last')
+    df = buoy.merge(uscg, on='time', how='outer')[['time'] + features]
 
     # Trim rows that have nan
-    rows_with_nan = df.isnull().any(axis=1)
-    rows_with_nan = [idx for idx, is_nan in enumerate(rows_with_nan) if is_nan]
-    df.drop(axis=0, index=rows_with_nan, inplace=True)
+    df.dropna(inplace=True)
 
     df.sort_values(by=['time'], inplace=True, ignore_index=True)
 
     remove_outliers(df)
 
     # Decompose wind speed and wind direction into vector
-    df['wind u'] = np.sin(np.radians(df['wind direction'])) * -1 * df['wind speed']
-    df['wind v'] = np.cos(np.radians(df['wind direction'])) * -1 * df['wind speed']
-    df.drop('wind direction', axis=1, inplace=True)
-    df.drop('wind speed', axis=1, inplace=True)
+    wind_direction = np.radians(df['wind direction'].to_numpy())
+    wind_speed = df['wind speed'].to_numpy()
+    df['wind u'] = -np.sin(wind_direction) * wind_speed
+    df['wind v'] = -np.cos(wind_direction) * wind_speed
+    df.drop(columns=['wind direction', 'wind speed'], inplace=True)
 
     # Redundacy here Ensure dataframe leaves with no NaNs
-    rows_with_nan = df.isnull().any(axis=1)
-    rows_with_nan = [idx for idx, is_nan in enumerate(rows_with_nan) if is_nan]
-    df.drop(axis=0, index=rows_with_nan, inplace=True)
+    df.dropna(inplace=True)
+    df.reset_index(drop=True, inplace=True)
     return df
 
 
@@ -266,52 +245,150 @@ def remove_outliers(df):
 
     5. Median filtering again
 
+    Only the features in ATTR_BOUNDS are cleaned, and they must not contain NaNs.
+
     Args:
         df (pd.DataFrame): dataframe containing historical AWS model data
     """
-    
-    median_filtering(df)
+    features = [feature for feature in ATTR_BOUNDS if feature in df.columns]
 
-    # Clip features between lo and hi
-    for feature, (lo, hi) in ATTR_BOUNDS.items():
-        # Clip features
-        if feature in df.columns:
-            df[feature] = np.clip(df[feature], lo, hi)
+    # One contiguous row of values per feature, so each feature is cleaned in a single traversal
+    values = df[features].to_numpy(dtype=np.float64).T.copy()
+    lo = np.array([ATTR_BOUNDS[feature][0] for feature in features], dtype=np.float64)
+    hi = np.array([ATTR_BOUNDS[feature][1] for feature in features], dtype=np.float64)
+    # Shortwave is an edge case, where its okay for data to sit at the bounds
+    replace_bounds = np.array([feature != 'shortwave' for feature in features])
 
-    # Set features > 3 std to mean
-    for feature in df.columns:
-        if feature == 'time':
-            continue
-
-        mean = df[feature].rolling(window=100, center=True, min_periods=1).mean()
-        std = df[feature].rolling(window=100, center=True, min_periods=1).std()
-        std[0] = 0 
-        lo = mean - 3 * std
-        hi = mean + 3 * std
+    _remove_outliers(values, lo, hi, replace_bounds)
+    df[features] = values.T
 
-        # Replace deviating features with mean
-        df[feature].where(lo < df[feature], mean, inplace=True)
-        df[feature].where(df[feature] < hi, mean, inplace=True)
 
-    for feature, (lo, hi) in ATTR_BOUNDS.items():
-        # Shortwave is an edge case, where its okay for data to sit at the bounds
-        if feature == 'shortwave' or feature not in df.columns:
+@njit(cache=True)
+def _median_filter(x, out):
+    """ Sets out[i] to the median of the 5 points centered at x[i], using
+    fewer points at the edges of x
+    """
+    n = x.size
+    # Interior points have a full window
+    for i in range(2, n - 2):
+        out[i] = _median5(x[i - 2], x[i - 1], x[i], x[i + 1], x[i + 2])
+
+    # Edge points have 3 or 4 points in their window
+    window = np.empty(5)
+    for i in range(n):
+        if 2 <= i < n - 2:
             continue
-        mean = df[feature].rolling(window=100, center=True, min_periods=1).mean()
-        df[feature].where(df[feature] != hi, mean, inplace=True)
-        df[feature].where(df[feature] != lo, mean, inplace=True)
-
-    median_filtering(df)
 
-
-def median_filtering(df):
-    """Replaces points with the median of neighboring points, inplace
+        # Insertion sort the window
+        size = 0
+        for k in range(max(i - 2, 0), min(i + 3, n)):
+            j = size
+            while j > 0 and window[j - 1] > x[k]:
+                window[j] = window[j - 1]
+                j -= 1
+            window[j] = x[k]
+            size += 1
+
+        if size % 2 == 1:
+            out[i] = window[size // 2]
+        else:
+            out[i] = (window[size // 2 - 1] + window[size // 2]) / 2
+
+
+@njit(cache=True)
+def _median5(a, b, c, d, e):
+    """ Branchless median of 5 values, built from min/max comparators """
+    lo = max(min(a, b), min(c, d))
+    hi = min(max(a, b), max(c, d))
+    # Median of e, lo, hi
+    return max(min(e, lo), min(max(e, lo), hi))
+
+
+@njit(cache=True)
+def _centered_mean_std(x, window, mean, std):
+    """ Sets mean[i] and std[i] to the mean and sample standard deviation of the
+    window centered at x[i], using fewer points at the edges of x. Windows are
+    aligned like pandas' `rolling(window, center=True, min_periods=1)`.
+    """
+    n = x.size
+    if n == 0:
+        return
+    before, after = window // 2, (window - 1) // 2
+
+    # Running sums are taken relative to x[0] to avoid cancellation in the variance
+    shift = x[0]
+    total = 0.0
+    total_sq = 0.0
+    count = 0
+    for k in range(min(after + 1, n)):
+        total += x[k] - shift
+        total_sq += (x[k] - shift) ** 2
+        count += 1
+
+    for i in range(n):
+        # Slide window to [i - before, i + after]
+        if i > 0:
+            k = i + after
+            if k < n:
+                total += x[k] - shift
+                total_sq += (x[k] - shift) ** 2
+                count += 1
+            k = i - before - 1
+            if k >= 0:
+                total -= x[k] - shift
+                total_sq -= (x[k] - shift) ** 2
+                count -= 1
+
+        mean[i] = shift + total / count
+        if count > 1:
+            variance = (total_sq - total * total / count) / (count - 1)
+            std[i] = np.sqrt(max(variance, 0.0))
+        else:
+            std[i] = 0.0
+
+
+# Compiled once for the fixed layout remove_outliers uses, and cached on disk
+# so later runs load the machine code instead of compiling it again
+@njit("void(float64[:, ::1], float64[:], float64[:], boolean[:])", parallel=True, fastmath=True, cache=True)
+def _remove_outliers(values, lo, hi, replace_bounds):
+    """ Numba kernel for remove_outliers, cleans each row of values inplace
 
     Args:
-        df (pd.DataFrame): DataFrame to filter
+        values (np.ndarray): 2D array, one row of values for each feature
+        lo (np.ndarray): lower bound of each feature
+        hi (np.ndarray): upper bound of each feature
+        replace_bounds (np.ndarray): whether to replace values sitting at the bounds of each feature
     """
-    for feature in df.columns:
-        if feature == 'time':
-            continue
-        median = df[feature].rolling(window=5, min_periods=1, center=True).median()
-        df[feature] = median
+    n_features, n = values.shape
+    for f in prange(n_features):
+        x = values[f]
+        buffer = np.empty(n)
+        mean = np.empty(n)
+        std = np.empty(n)
+
+        # 1. Median filtering
+        _median_filter(x, buffer)
+        x[:] = buffer
+
+        # 2. Clip features between lo and hi
+        for i in range(n):
+            x[i] = min(max(x[i], lo[f]), hi[f])
+
+        # 3. Set features > 3 std to mean
+        _centered_mean_std(x, 100, mean, std)
+        if n > 0:
+            std[0] = 0
+        for i in range(n):
+            if not (mean[i] - 3 * std[i] < x[i] < mean[i] + 3 * std[i]):
+                x[i] = mean[i]
+
+        # 4. Set features sitting at the bounds to mean
+        if replace_bounds[f]:
+            _centered_mean_std(x, 100, mean, std)
+            for i in range(n):
+                if x[i] == lo[f] or x[i] == hi[f]:
+                    x[i] = mean[i]
+
+        # 5. Median filtering again
+        _median_filter(x, buffer)
+        x[:] = buffer
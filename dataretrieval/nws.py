@@ -14,94 +14,139 @@ Suggested Usage:
 4  2022-02-03 16:00:00+00:00        NaN -13.888889                   NaN                  44  166.650116  16.420700  20.065438
 """
 
-from collections import defaultdict
 from datetime import timedelta
 from math import nan
-from dateutil import parser
+import re
+from cachetools import TTLCache
+import orjson
 import requests
 import pandas as pd
 import numpy as np
+from dataretrieval.session import SESSION, REQUEST_TIMEOUT
 
 
-def parse_interval(interval):
+# NWS gridpoint for Lake Tahoe
+NWS_OFFICE = "REV"
+NWS_GRID_X, NWS_GRID_Y = 33, 87
+
+# Successful responses by (office, gx, gy)
+_RESPONSE_CACHE = TTLCache(maxsize=16, ttl=30 * 60)
+# Most recent successful response by (office, gx, gy), used when the API fails
+_LAST_RESPONSES = {}
+
+# ISO 8601 duration, e.g. 'PT4H' or 'P1DT6H'
+DURATION_PATTERN = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+
+def parse_intervals(intervals):
     """
-    Utility function that parses an ISO 8601 date string with a duration of time.
+    Utility function that parses ISO 8601 date strings with durations of time.
     e.g.  '2022-02-04T02:00:00+00:00/PT4H' represents 4 hours starting from 2 am on 2022-02-04
-    
-    Expects duration to be formatted as `PTnHnMnS`.
+
+    Expects durations to be formatted as `PnDTnHnMnS`. All dates are parsed with a single
+    call to pandas.
 
     See https://en.wikipedia.org/wiki/ISO_8601#Time_intervals to see how ISO 8601 timestamps
     are formatted.
 
+    Arguments:
+        intervals (list[str]): ISO 8601 date strings with intervals
+    Returns:
+        tuple(pandas.DatetimeIndex, numpy.ndarray): times (in UTC) and durations (in hours)
+    """
+    dates, hours = [], []
+    for interval in intervals:
+        date, duration = split_interval(interval)
+        dates.append(date)
+        hours.append(parse_duration(duration))
+
+    times = pd.to_datetime(dates, utc=True, format="%Y-%m-%dT%H:%M:%S%z")
+    return times, np.array(hours, dtype=int)
+
+
+def split_interval(interval):
+    """
+    Utility function that splits an ISO 8601 date string with a duration of time
+    into its date and duration. Dates without an interval have an empty duration.
+
     Arguments:
         interval (str): an ISO 8601 date string with an interval
     Returns:
-        tuple(datetime.datetime, int): time and duration (in hours)
+        tuple(str, str): date and duration
     """
     solidus = '/' if '/' in interval else '--' if '--' in interval else None
     # Date does not contain interval
     if solidus is None: 
-        return parser.parse(interval), 0
+        return interval, ''
 
     date, duration = interval.split(solidus)
-    hours = 0
-    integer = 0
-    for letter in duration:
-        if letter.isdigit():
-            integer = 10 * integer + int(letter)
-        elif letter == 'H':
-            hours += integer # hours
-            integer = 0
-        elif letter == 'M':
-            hours += integer // 60 # 60 min in hour
-            integer = 0
-        elif letter == 'S':
-            hours += integer // 360 # 360 sec in hour
-            integer = 0
-
-    return parser.parse(date), hours
-
-
-def round_to_nearest_hour(date):
+    return date, duration
+
+
+def parse_duration(duration):
     """
-    A Utility function that rounds a date to the nearest hour
+    Utility function that parses an ISO 8601 duration formatted as `PnDTnHnMnS`.
+    An empty duration is 0 hours.
+
     Arguments:
-        date (datetime.datetime)
+        duration (str): an ISO 8601 duration
     Returns:
-        (datetime.datetime)
+        (int): duration (in hours)
     """
-    if date.minute >= 30:
-        return date.replace(hour=date.hour + 1, minute=0, second=0)
-    else:
-        return date.replace(hour=date.hour, minute=0, second=0)
+    if duration == '':
+        return 0
 
+    match = DURATION_PATTERN.fullmatch(duration)
+    if match is None:
+        raise ValueError(f"Invalid ISO 8601 duration: {duration}")
 
-def get_nws_json():
+    days, hours, minutes, seconds = (int(x) if x else 0 for x in match.groups())
+    return 24 * days + hours + minutes // 60 + seconds // 3600
+
+
+def get_nws_json(office=NWS_OFFICE, gx=NWS_GRID_X, gy=NWS_GRID_Y):
     """
-    Retrieves data from the nws api and returns a dictionary of that data
+    Retrieves data from the nws api and returns a dictionary of that data.
+    Successful responses are cached for 30 minutes, since NWS gridpoint
+    forecasts are only updated about every hour.
 
-    gx, gy are constants from the following api call for lake tahoe (39.0961,-120.0397)
+    gx, gy default to the gridpoint from the following api call for lake tahoe (39.0961,-120.0397)
     https://api.weather.gov/points/{latitude},{longitude} 
+
+    Arguments:
+        office (str): NWS forecast office
+        gx (int): x coordinate of the gridpoint
+        gy (int): y coordinate of the gridpoint
     """
-    base_url = "https://api.weather.gov/"
-    office = "REV" 
-    gx, gy = 33, 87 # Lake Tahoe
+    key = (office, gx, gy)
+    # A single lookup, so the entry can't expire between checking and reading it
+    cached = _RESPONSE_CACHE.get(key)
+    if cached is not None:
+        return cached
 
+    base_url = "https://api.weather.gov/"
     url = base_url + f"gridpoints/{office}/{gx},{gy}"
     headers = {
         "User-Agent": "(Lake Tahoe Hazardous Warning System, maksimovich.sam@gmail.com)",
         "Accept": "application/geo+json"
     }
+    response = orjson.loads(SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT).content)
 
-    response = requests.get(url, headers=headers).json()
+    if 'properties' in response:
+        _RESPONSE_CACHE[key] = response
+        _LAST_RESPONSES[key] = response
     return response
 
 
-def get_model_forecast_data():
+def get_model_forecast_data(office=NWS_OFFICE, gx=NWS_GRID_X, gy=NWS_GRID_Y):
     """
     Retrieves data from the nws api and filters it to contain only data
     required by the model 
 
+    Arguments:
+        office (str): NWS forecast office
+        gx (int): x coordinate of the gridpoint
+        gy (int): y coordinate of the gridpoint
     Returns:
         pandas.DataFrame - tabulated model forecast inputs, example below:
                                time  shortwave   air temp  atmospheric pressure   relative humidity    longwave     wind u     wind v  
@@ -118,7 +163,11 @@ def get_model_forecast_data():
     # Attempt to get data from NWS API multiple times
     # Sometimes API fails and gives us 'Unexpected Problem' as a response
     for req_attempt in range(5):
-        data = get_nws_json()
+        try:
+            data = get_nws_json(office, gx, gy)
+        except (requests.RequestException, orjson.JSONDecodeError):
+            data = {}
+
         if 'properties' in data:
             # API returned data successfully
             break
@@ -127,42 +176,58 @@ def get_model_forecast_data():
 
     if 'properties' not in data:
         # API failed to return data multiple times
-        # API is most likely down, so throw an Exception
-        raise Exception("National Weather Service API (NWS) is likely down. Could not retrieve forecasted weather data")
+        # Fall back to the last forecast we retrieved, if any
+        data = _LAST_RESPONSES.get((office, gx, gy))
+        if data is None:
+            # API is most likely down, so throw an Exception
+            raise Exception("National Weather Service API (NWS) is likely down. Could not retrieve forecasted weather data")
+        print("get_model_forecast_data(): NWS API is likely down, using the last forecast data retrieved")
 
     nws_features = ['windDirection', 'windSpeed', 'temperature', 'skyCover', 'relativeHumidity']
-    model_data = defaultdict(lambda: [nan] * len(nws_features))
-    
+
+    # The NWS gives us not dates, but intervals of time
+    # I parse the interval of time, including its start and duration
+    # I convert the start to the nearest hour and sample for every hour in the duration
+    f_indices, intervals, values = [], [], []
     for f_idx, feature in enumerate(nws_features):
         for sample in data['properties'][feature]['values']:
-            # The NWS gives us not dates, but intervals of time
-            # I parse the interval of time, including its start and duration
-            # I convert the start to the nearest hour and sample for every hour in the duration
-            time, duration = parse_interval(sample['validTime'])
-            value = sample['value']
-            time = round_to_nearest_hour(time)
-
-            for hour in range(0, duration):
-                model_data[time + timedelta(hours=hour)][f_idx] = value
-
-    df = pd.DataFrame(
-        [[time] + values for time, values in model_data.items()],
-        columns=['time'] + nws_features
-    )
+            f_indices.append(f_idx)
+            intervals.append(sample['validTime'])
+            values.append(nan if sample['value'] is None else sample['value'])
+
+    one_hour = timedelta(hours=1)
+    times, durations = parse_intervals(intervals)
+    if len(times) == 0:
+        # No feature has any samples, so there are no rows to forecast
+        return pd.DataFrame(columns=features)
+
+    # Round to the nearest hour, flooring after adding 30 minutes also rolls over days
+    times = (times + timedelta(minutes=30)).floor(one_hour)
+
+    # Hourly samples are written into a preallocated table, one row per hour
+    # starting from the earliest hour any feature is given for
+    start = times.min()
+    end = (times + pd.to_timedelta(durations, unit='h')).max()
+    n_hours = (end - start) // one_hour
+    rows = (times - start) // one_hour
+    model_data = np.full((n_hours, len(nws_features)), nan)
+
+    for f_idx, row, duration, value in zip(f_indices, rows, durations, values):
+        model_data[row:row + duration, f_idx] = value
+
+    df = pd.DataFrame(model_data, columns=nws_features)
+    df.insert(0, 'time', pd.date_range(start, periods=n_hours, freq=one_hour))
     # Rename NWS labels to be consistent with AWS
     df.rename(columns={"temperature" : "air temp", "relativeHumidity": "relative humidity"}, inplace=True)
 
     # Trim rows with nan
-    rows_with_nan = df.isnull().any(axis=1)
-    rows_with_nan = [idx for idx, is_nan in enumerate(rows_with_nan) if is_nan]
-    df.drop(axis=0, index=rows_with_nan, inplace=True)
+    df.dropna(inplace=True)
 
     # Temporary shortwave formula based on historical AWS data
     # To see this formula visit https://www.desmos.com/calculator/wawbpdxtkd
-    hourize = lambda t: t.hour + t.minute / 60
+    hours = df['time'].dt.hour + df['time'].dt.minute / 60
     f = lambda t: 1014 * np.exp(-0.05072 * (t - 1.1238e-01)**2)
-    g = lambda t: f(((hourize(t) + -10) % 24) - 10)
-    df['shortwave'] = [g(t_i) for t_i in df['time']]
+    df['shortwave'] = f(((hours + -10) % 24) - 10)
 
     # Based on historical pressure and confirmed by barometric pressure eq 
     df['atmospheric pressure'] = 81600 # Pa
@@ -7,7 +7,8 @@ List of Tasks:
     - This retrieves data from AWS and NWS and stores it in a database
     - TODO Notes:
     - Since MySQL is not set up yet, this will store the retrieved data in a
-    csv file. If the csv file already exists, it will append the data to it.
+    parquet dataset partitioned by month. If the dataset already exists, it will
+    append the data to it, only rewriting the months that changed.
 
 2. create_si3d_surfbc
     - This creates input file 'surfbc.txt' for the model
@@ -21,6 +22,8 @@ from dataretrieval.aws import get_model_historical_data
 from dataretrieval.nws import get_model_forecast_data
 import datetime
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 import os
 import logging
 
@@ -35,21 +38,56 @@ logging.basicConfig(
 )
 
 class DataRetrievalService:
-    ARCHIVE_DATA = False        # if set to true, will store model inputs in a csv file
-    CSV_FILE = "./database.csv"
+    ARCHIVE_DATA = False        # if set to true, will store model inputs in a parquet dataset
+    DATABASE_DIR = "./database"  # parquet dataset, partitioned by year and month
+    PARTITIONING = ds.partitioning(pa.schema([("year", pa.int32()), ("month", pa.int32())]), flavor="hive")
 
     def __init__(self):
-        # Use csv file as database for now
-        if self.ARCHIVE_DATA and os.path.isfile(self.CSV_FILE):
-            self.db = pd.read_csv(self.CSV_FILE)
-            self.db['time'] = pd.to_datetime(self.db['time'])
+        self.unsaved_since = None # earliest time in self.db that has not been saved
+
+        # Use parquet dataset as database for now
+        if self.ARCHIVE_DATA and os.path.isdir(self.DATABASE_DIR):
+            # retrieve only replaces the last 10 days, so older months are never needed
+            today = datetime.datetime.now(datetime.timezone.utc)
+            last_month = today.replace(day=1) - datetime.timedelta(days=1)
+            self.db = self.load(last_month.year, last_month.month)
         else:
             self.db = None
 
 
+    def load(self, year, month):
+        """ Loads the database from the start of the given month onwards
+
+        Args:
+            year (int): year of the first month to load
+            month (int): first month to load
+        Returns:
+            (pd.DataFrame): database rows sorted by time
+        """
+        dataset = ds.dataset(self.DATABASE_DIR, format="parquet", partitioning=self.PARTITIONING)
+        since = (ds.field("year") > year) | ((ds.field("year") == year) & (ds.field("month") >= month))
+        db = dataset.to_table(filter=since).to_pandas()
+        db.drop(columns=["year", "month"], inplace=True)
+        db.sort_values(by=['time'], inplace=True, ignore_index=True)
+        return db
+
+
     def save(self):
-        if self.ARCHIVE_DATA and self.db is not None:
-            self.db.to_csv(self.CSV_FILE, index=False)
+        if self.ARCHIVE_DATA and self.db is not None and self.unsaved_since is not None:
+            # Rewrite only the months that contain unsaved data
+            month_start = self.unsaved_since.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            data = self.db[self.db['time'] >= month_start]
+            data = data.assign(year=data['time'].dt.year, month=data['time'].dt.month)
+
+            ds.write_dataset(
+                pa.Table.from_pandas(data, preserve_index=False),
+                self.DATABASE_DIR,
+                format="parquet",
+                partitioning=self.PARTITIONING,
+                existing_data_behavior="delete_matching",
+                file_options=ds.ParquetFileFormat().make_write_options(compression="zstd")
+            )
+            self.unsaved_since = None
 
 
     def retrieve(self):
@@ -68,15 +106,17 @@ class DataRetrievalService:
             nws_data[nws_data['time'] > most_recent_aws_date]
         ], ignore_index=True)
 
+        earliest_date = combined_data['time'][0]
         if self.db is None:
             self.db = combined_data
         else:
-            earliest_date = combined_data['time'][0]
+            # self.db is sorted by time, so keep every row before the first replaced one
+            cut = self.db['time'].searchsorted(earliest_date)
             self.db = pd.concat([
-                self.db[self.db['time'] < earliest_date],
+                self.db.iloc[:cut],
                 combined_data
-            ])
-        self.db.reset_index(drop=True, inplace=True)
+            ], ignore_index=True)
+        self.unsaved_since = earliest_date
 
         self.save()
 
@@ -0,0 +1,18 @@
+""" The purpose of this file is to share one HTTP session between the
+AWS and NWS data retrieval modules, so connections are reused and every
+endpoint gets the same retry policy and timeout.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Requests share one session so connections to each endpoint are reused
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.3)
+))
+# Seconds to wait for an endpoint to respond
+REQUEST_TIMEOUT = 30
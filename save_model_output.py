@@ -1,9 +1,12 @@
 import os
 import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
 import S3
 
 OUTPUT_DIRS = ["./outputs/flow", "./outputs/temperature"]
+UPLOAD_WORKERS = 16  # number of files uploaded to S3 at the same time
 
 logFilename = "logs/s3_log.log"
 logging.basicConfig(
@@ -20,9 +23,18 @@ def save_model_output() -> None:
 
     s3 = S3.S3()  # s3 client with methods specific to our needs
 
+    # Collect files to send to backend server
+    uploads: List[Tuple[str, str, bool]] = []
     for localDir in OUTPUT_DIRS:
         bucketSubDirectory: str = getLastDirectoryInPath(localDir)
-        for filename in os.listdir(localDir):
+        # Files not modified since the cutoff were sent by an earlier run, skip them
+        # without parsing their names. Send the most recently modified files first
+        with os.scandir(localDir) as entries:
+            recentEntries = [entry for entry in entries if entry.is_file() and entry.stat().st_mtime > today.timestamp()]
+        recentEntries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+
+        for entry in recentEntries:
+            filename = entry.name
             # Send file to backend server if file's timestamp is greater than today
             # Parse timestamp from file
             file_date = datetime.datetime.strptime(filename, "%Y-%m-%d %H.npy")
@@ -30,14 +42,17 @@ def save_model_output() -> None:
             file_date = file_date.replace(tzinfo=datetime.timezone.utc)
 
             if file_date > today:
-                # Read and send file
                 fileLocation = f"{localDir}/{filename}"
                 flow = (bucketSubDirectory == "flow")  # if false then file will be uploaded to temperature
-                successful, msg = s3.uploadToS3(fileLocation, filename, flow)
-                if successful:
-                    s3.prettyPrint(msg, title="File Upload Response: ")
-                else:
-                    logging.error("Upload Failed!")
+                uploads.append((fileLocation, filename, flow))
+
+    # Send files concurrently, each upload is mostly waiting on the network
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        for successful, msg in executor.map(lambda upload: s3.uploadToS3(*upload), uploads):
+            if successful:
+                s3.prettyPrint(msg, title="File Upload Response: ")
+            else:
+                logging.error("Upload Failed!")
     
     # update contents.json
     _, response = s3.updateContents()